@@ -4,46 +4,188 @@
     binary.py, a python library to easily manipulate binary data.
 """
 
+# Modules built into the interpreter or already loaded by os are imported
+# here. Heavier ones (array, threading) are imported by the entry point of the
+# feature needing them so that a plain import stays cheap.
 import binascii
 import io
+import itertools
 import os
+import stat
 import struct
+import sys
+import time
 
 __version__ = '0.1.0'
-__all__ = ['File', 'Buffer', 'Wrapper']
+__all__ = ['File', 'Buffer', 'Wrapper', 'Journal', 'SocketStream',
+    'RecordIndex', 'hexdump']
+
+class _Int24:
+    """
+        Mimic a Struct object for 24 bits integers, which struct lacks.
+    """
+    size = 3
+
+    def __init__(self, symbol, signed):
+        if symbol == '<' or (symbol == '=' and sys.byteorder == 'little'):
+            self.byteorder = 'little'
+        else:
+            self.byteorder = 'big'
+        self.signed = signed
+
+    def pack(self, value):
+        if not isinstance(value, int):
+            raise struct.error('required argument is not an integer')
+        try:
+            return value.to_bytes(3, self.byteorder, signed=self.signed)
+        except OverflowError as e:
+            raise struct.error(str(e))
+
+    def unpack(self, data):
+        if len(data) != 3:
+            raise struct.error('unpack requires a buffer of 3 bytes')
+        return (int.from_bytes(data, self.byteorder, signed=self.signed),)
+
+    def unpack_from(self, buffer, offset=0):
+        return self.unpack(bytes(memoryview(buffer)[offset:offset + 3]))
+
+
+class _Endian(dict):
+    """
+        Improve performances by reusing Struct objects. Each one is created
+        the first time it is needed to keep the import cheap.
+    """
+    formats = {
+        'bool': '?',
+        'byte': 'b',
+        'ubyte': 'B',
+        'short': 'h',
+        'ushort': 'H',
+        'int': 'i',
+        'uint': 'I',
+        'float': 'f',
+        'long': 'q',
+        'ulong': 'Q',
+        'double': 'd',
+        'half': 'e',
+    }
+
+    names = ('symbol',) + tuple(formats) + ('int24', 'uint24')
+
+    def __init__(self, symbol):
+        super().__init__(symbol=symbol)
+
+    # behave as if every type was there even before it is created
+    def __contains__(self, key):
+        return key in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __eq__(self, other):
+        if isinstance(other, _Endian):
+            return self['symbol'] == other['symbol']
+        return dict(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<endian {!r}>'.format(self['symbol'])
+
+    def get(self, key, default=None):
+        return self[key] if key in self.names else default
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return [self[key] for key in self.names]
+
+    def items(self):
+        return [(key, self[key]) for key in self.names]
+
+    def __missing__(self, key):
+        if key in ('int24', 'uint24'):
+            value = _Int24(self['symbol'], key == 'int24')
+        else:
+            value = struct.Struct(self['symbol'] + self.formats[key])
+        self[key] = value
+        return value
+
+BE = BIG_ENDIAN = _Endian('>')
+LE = LITTLE_ENDIAN = _Endian('<')
+NE = NATIVE_ENDIAN = _Endian('=')
 
 """
-    Improve performances by reusing Struct objects.
+    Large fills and skips are performed in chunks of this size to keep memory
+    usage constant.
 """
-BE = BIG_ENDIAN = {
-    'symbol': '>',
-    'bool': struct.Struct('?'),
-    'byte': struct.Struct('b'),
-    'ubyte': struct.Struct('B'),
-    'short': struct.Struct('>h'),
-    'ushort': struct.Struct('>H'),
-    'int': struct.Struct('>i'),
-    'uint': struct.Struct('>I'),
-    'float': struct.Struct('>f'),
-    'long': struct.Struct('>q'),
-    'ulong': struct.Struct('>Q'),
-    'double': struct.Struct('>d'),
-}
-LE = LITTLE_ENDIAN = {
-    'symbol': '<',
-    'bool': BIG_ENDIAN['bool'],
-    'byte': BIG_ENDIAN['byte'],
-    'ubyte': BIG_ENDIAN['ubyte'],
-    'short': struct.Struct('<h'),
-    'ushort': struct.Struct('<H'),
-    'int': struct.Struct('<i'),
-    'uint': struct.Struct('<I'),
-    'float': struct.Struct('<f'),
-    'long': struct.Struct('<q'),
-    'ulong': struct.Struct('<Q'),
-    'double': struct.Struct('<d'),
+_CHUNK_SIZE = 65536
+_ZERO_CHUNK = bytes(_CHUNK_SIZE)
+
+"""
+    Maximum amount of buffers given to a single sendmsg() call.
+"""
+_IOV_MAX = 1024
+
+"""
+    Kind of array able to store each type, see _Binary.read_columns().
+"""
+_COLUMN_KINDS = {
+    'bool': 'BHILQ',
+    'byte': 'bhilq',
+    'ubyte': 'BHILQ',
+    'short': 'bhilq',
+    'ushort': 'BHILQ',
+    'int': 'bhilq',
+    'uint': 'BHILQ',
+    'long': 'bhilq',
+    'ulong': 'BHILQ',
+    'float': 'fd',
+    'double': 'fd',
 }
 
+def _zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def _encode_varints(values, out):
+    """
+        Append the unsigned LEB128 encoding of <values> to bytearray <out>.
+    """
+    for value in values:
+        if value < 0:
+            raise ValueError('varint must be non-negative')
+        while value > 0x7f:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+def _decode_varints(data):
+    """
+        Decode all the unsigned LEB128 integers in <data>.
+    """
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        raise ValueError('truncated varint')
+    return values
+
 class _Binary:
     """
         Contain all the code to convert to/from binary.
@@ -55,7 +197,44 @@ class _Binary:
         """
             Fill <length> with optional <value> (defaults: nullbyte).
         """
-        self.write(value * length)
+        if not value or length <= 0:
+            return
+        if value == b'\x00':
+            chunk = _ZERO_CHUNK
+        else:
+            chunk = value * max(_CHUNK_SIZE // len(value), 1)
+        remaining = len(value) * length
+        while remaining > len(chunk):
+            self.write(chunk)
+            remaining -= len(chunk)
+        self.write(memoryview(chunk)[:remaining])
+
+    def skip(self, length):
+        """
+            Move the pointer <length> bytes forward. Non-seekable streams are
+            read and the data discarded.
+        """
+        seekable = getattr(self, 'seekable', None)
+        if seekable is not None and seekable():
+            self.seek(length, os.SEEK_CUR)
+            return
+        while length > 0:
+            data = self.read(min(length, _CHUNK_SIZE))
+            if not data:
+                break
+            length -= len(data)
+
+    def align(self, boundary, value=None):
+        """
+            Move the pointer to the next multiple of <boundary>. The gap is
+            skipped, or filled with <value> (repeated and truncated to the
+            gap) if provided.
+        """
+        gap = -self.tell() % boundary
+        if value is None:
+            self.skip(gap)
+        else:
+            self.write((value * gap)[:gap])
 
     def peek(self, length=-1):
         """
@@ -67,6 +246,153 @@ class _Binary:
         self.seek(position)
         return data
 
+    def _columns(self, layout):
+        """
+            Return the size of a record and, for each field of <layout>, its
+            offset, size and array typecode.
+        """
+        fields = []
+        offset = 0
+        for kind in layout:
+            if isinstance(kind, int):
+                offset += kind
+                continue
+            size = self.endian[kind].size
+            for typecode in _COLUMN_KINDS.get(kind, ''):
+                # array items have the native size of the struct format
+                if struct.calcsize(typecode) == size:
+                    break
+            else:
+                raise ValueError('unsupported column type: {}'.format(kind))
+            fields.append((offset, size, typecode))
+            offset += size
+        if not fields:
+            raise ValueError('layout has no field')
+        return offset, fields
+
+    def _swap(self):
+        symbol = self.endian['symbol']
+        if symbol == '=':
+            return False
+        return (symbol == '<') != (sys.byteorder == 'little')
+
+    def read_columns(self, layout, count):
+        """
+            Read <count> records made of the types listed in <layout> (an
+            integer skips that many bytes) in a single read. Return one
+            array per field.
+
+            Near the end fewer records are returned; the bytes of a trailing
+            incomplete record are left unread on seekable streams.
+        """
+        import array
+        if count < 0:
+            raise ValueError('negative count: {}'.format(count))
+        record_size, fields = self._columns(layout)
+        data = self.read(record_size * count)
+        count = len(data) // record_size
+        partial = len(data) - record_size * count
+        seekable = getattr(self, 'seekable', None)
+        if partial and seekable is not None and seekable():
+            self.seek(-partial, os.SEEK_CUR)
+        columns = []
+        for offset, size, typecode in fields:
+            # gather each byte of the field from every record at once
+            raw = bytearray(size * count)
+            for i in range(size):
+                raw[i::size] = data[offset + i:record_size * count:record_size]
+            column = array.array(typecode)
+            column.frombytes(raw)
+            if size > 1 and self._swap():
+                column.byteswap()
+            columns.append(column)
+        return columns
+
+    def write_columns(self, layout, columns):
+        """
+            Write records made of the types listed in <layout> (an integer
+            writes that many null bytes) taking the values of each field
+            from <columns>.
+        """
+        import array
+        record_size, fields = self._columns(layout)
+        if len(columns) != len(fields):
+            raise ValueError('expected {} columns'.format(len(fields)))
+        count = len(columns[0]) if columns else 0
+        data = bytearray(record_size * count)
+        for (offset, size, typecode), column in zip(fields, columns):
+            if len(column) != count:
+                raise ValueError('columns must have the same length')
+            column = array.array(typecode, column)
+            if size > 1 and self._swap():
+                column.byteswap()
+            raw = column.tobytes()
+            for i in range(size):
+                data[offset + i::record_size] = raw[i::size]
+        self.write(data)
+
+    def _write_block(self, values):
+        """
+            Write <values> as zigzag varints preceded by their count and
+            size, so they can be read back in one go.
+        """
+        data = bytearray()
+        _encode_varints(map(_zigzag, values), data)
+        header = bytearray()
+        _encode_varints((len(values), len(data)), header)
+        self.write(header + data)
+
+    def _read_block(self):
+        count = self.read_varint()
+        data = self.read(self.read_varint())
+        values = list(map(_unzigzag, _decode_varints(data)))
+        if len(values) != count:
+            raise ValueError('truncated block')
+        return values
+
+    def write_deltas(self, values, order=1):
+        """
+            Write a sequence of integers as the differences between
+            consecutive values, applied <order> times (2 being
+            delta-of-delta). Suited to sorted or regular values.
+        """
+        values = list(values)
+        for i in range(order):
+            values[i + 1:] = [b - a for a, b in
+                zip(values[i:], values[i + 1:])]
+        self._write_block(values)
+
+    def read_deltas(self, order=1):
+        """
+            Read a sequence written by write_deltas() with the same <order>.
+            Return a list.
+        """
+        values = self._read_block()
+        for i in reversed(range(order)):
+            values[i:] = itertools.accumulate(values[i:])
+        return values
+
+    def write_runs(self, values):
+        """
+            Write a sequence of integers as pairs of value and repetitions.
+            Suited to values which seldom change.
+        """
+        runs = []
+        for value, run in itertools.groupby(values):
+            runs.append(value)
+            runs.append(sum(1 for _ in run))
+        self._write_block(runs)
+
+    def read_runs(self):
+        """
+            Read a sequence written by write_runs(). Return a list.
+        """
+        runs = self._read_block()
+        values = []
+        for value, count in zip(runs[::2], runs[1::2]):
+            values.extend(itertools.repeat(value, count))
+        return values
+
     def peek_bool(self):
         return self.endian['bool'].unpack(self.peek(1))[0]
     def peek_byte(self):
@@ -89,8 +415,34 @@ class _Binary:
         return self.endian['ulong'].unpack(self.peek(8))[0]
     def peek_double(self):
         return self.endian['double'].unpack(self.peek(8))[0]
-    def peek_hex(self, length):
-        return binascii.hexlify(self.peek(length)).decode()
+    def peek_half(self):
+        return self.endian['half'].unpack(self.peek(2))[0]
+    def peek_int24(self):
+        return self.endian['int24'].unpack(self.peek(3))[0]
+    def peek_uint24(self):
+        return self.endian['uint24'].unpack(self.peek(3))[0]
+    def peek_hex(self, length, sep=None):
+        if sep is None:
+            return binascii.hexlify(self.peek(length)).decode()
+        return self.peek(length).hex(sep)
+    def _peek_varint(self):
+        """
+            Decode the varint at the pointer from a small peek. Return its
+            value and size.
+        """
+        size = 10 # enough for 64 bits
+        while True:
+            data = self.peek(size)
+            for i, byte in enumerate(data):
+                if not byte & 0x80:
+                    return _decode_varints(data[:i + 1])[0], i + 1
+            if len(data) < size:
+                raise EOFError('truncated varint')
+            size *= 2
+    def peek_varint(self):
+        return self._peek_varint()[0]
+    def peek_svarint(self):
+        return _unzigzag(self.peek_varint())
     def peek_text(self, length, encoding='utf-8', error='ignore'):
         data = self.peek(length).decode(encoding, error)
         # http://mail.python.org/pipermail/tutor/2001-June/006382.html
@@ -122,8 +474,34 @@ class _Binary:
         return self.endian['ulong'].unpack(self.read(8))[0]
     def read_double(self):
         return self.endian['double'].unpack(self.read(8))[0]
-    def read_hex(self, length):
-        return binascii.hexlify(self.read(length)).decode()
+    def read_half(self):
+        return self.endian['half'].unpack(self.read(2))[0]
+    def read_int24(self):
+        return self.endian['int24'].unpack(self.read(3))[0]
+    def read_uint24(self):
+        return self.endian['uint24'].unpack(self.read(3))[0]
+    def read_hex(self, length, sep=None):
+        if sep is None:
+            return binascii.hexlify(self.read(length)).decode()
+        return self.read(length).hex(sep)
+    def read_varint(self):
+        seekable = getattr(self, 'seekable', None)
+        if seekable is not None and seekable():
+            # avoid a read per byte on unbuffered files
+            value, size = self._peek_varint()
+            self.seek(size, os.SEEK_CUR)
+            return value
+        value = shift = 0
+        while True:
+            byte = self.read(1)
+            if not byte:
+                raise EOFError('truncated varint')
+            value |= (byte[0] & 0x7f) << shift
+            if not byte[0] & 0x80:
+                return value
+            shift += 7
+    def read_svarint(self):
+        return _unzigzag(self.read_varint())
     def read_text(self, length, encoding='utf-8', error='ignore'):
         data = self.read(length).decode(encoding, error)
         try:
@@ -154,6 +532,18 @@ class _Binary:
         self.write(self.endian['ulong'].pack(data))
     def write_double(self, data):
         self.write(self.endian['double'].pack(data))
+    def write_half(self, data):
+        self.write(self.endian['half'].pack(data))
+    def write_int24(self, data):
+        self.write(self.endian['int24'].pack(data))
+    def write_uint24(self, data):
+        self.write(self.endian['uint24'].pack(data))
+    def write_varint(self, data):
+        out = bytearray()
+        _encode_varints((data,), out)
+        self.write(out)
+    def write_svarint(self, data):
+        self.write_varint(_zigzag(data))
     def write_hex(self, data, length=None):
         data = binascii.unhexlify(data.encode())
         self.write_length(data, length)
@@ -177,6 +567,152 @@ class File(io.FileIO, _Binary):
         super().__init__(file, mode, closefd, opener)
 
 
+class Journal(File):
+    """
+        Append records to a file, writing them in groups.
+
+        Records are built with the usual write methods and ended with
+        commit(). Committed records are written once <group_size> bytes are
+        waiting, on flush(), or every <flush_interval> seconds by a
+        background thread. <sync> controls durability: 'never', 'group'
+        (after each write) or 'interval' (at most every <sync_interval>
+        seconds, a background thread being started if needed to keep that
+        bound). An error in the background thread is raised by the next call
+        to commit(), flush() or close().
+
+        tell() accounts for the data not written yet; the journal can not
+        seek, so skip(), peek() and align() without a value are unsupported.
+    """
+    def __init__(self, file, endian=BE, group_size=_CHUNK_SIZE,
+            flush_interval=None, sync='group', sync_interval=1.,
+            datasync=False):
+        if sync not in ('never', 'group', 'interval'):
+            raise ValueError('invalid sync policy: {!r}'.format(sync))
+        import threading
+        super().__init__(file, 'ab', endian=endian)
+        self.group_size = group_size
+        self.sync = sync
+        self.sync_interval = sync_interval
+        if datasync and hasattr(os, 'fdatasync'):
+            self._sync_function = os.fdatasync
+        else:
+            self._sync_function = os.fsync
+        self._record = bytearray()
+        self._group = bytearray()
+        self._lock = threading.Lock()
+        self._synced = True
+        self._last_sync = time.monotonic()
+        self._thread = None
+        self._error = None
+        if sync == 'interval' and flush_interval is None:
+            flush_interval = sync_interval
+        if flush_interval is not None:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run,
+                args=(flush_interval,), daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self._error = e
+                return
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def tell(self):
+        """
+            Return the position the next written byte will have in the file.
+        """
+        with self._lock:
+            return super().tell() + len(self._group) + len(self._record)
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def peek(self, length=-1):
+        raise io.UnsupportedOperation('peek')
+
+    def write(self, data):
+        """
+            Add <data> to the current record.
+        """
+        self._record += data
+        return len(data)
+
+    def commit(self):
+        """
+            End the current record, writing the group if it is large enough.
+        """
+        self._check()
+        with self._lock:
+            self._group += self._record
+            full = len(self._group) >= self.group_size
+        self._record = bytearray()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+            Write the committed records and sync according to the policy.
+        """
+        self._check()
+        with self._lock:
+            if self.closed:
+                return
+            self._write_group()
+            if self.sync == 'group' or (self.sync == 'interval' and
+                    time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync()
+
+    def _write_group(self):
+        if not self._group:
+            return
+        self._synced = False
+        written = 0
+        try:
+            with memoryview(self._group) as view:
+                while written < len(view):
+                    written += super().write(view[written:])
+        finally:
+            # never write the same data twice if an error occurs
+            del self._group[:written]
+
+    def _sync(self):
+        if self._synced:
+            return
+        self._sync_function(self.fileno())
+        self._synced = True
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """
+            Commit the current record, write everything, sync and close.
+        """
+        if self.closed:
+            return
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        try:
+            with self._lock:
+                self._group += self._record
+                self._record = bytearray()
+                self._write_group()
+                if self.sync != 'never':
+                    self._sync()
+        finally:
+            super().close()
+        self._check()
+
+
 class Buffer(io.BytesIO,_Binary):
     """
         Create a binary buffer in memory.
@@ -195,13 +731,60 @@ class Buffer(io.BytesIO,_Binary):
         return b
 
     @classmethod
-    def from_file(cls, file, endian=BE):
+    def from_file(cls, file, endian=BE, offset=0, length=None):
         """
-            Place the entire content of a file in a buffer. Return that
-            buffer.
+            Place the content of a file in a buffer, optionally starting at
+            <offset> and limited to <length> bytes. Return that buffer.
+
+            Regular files are read straight into a buffer allocated at its
+            final size so the data is copied only once, even for large files.
         """
-        with open(file, 'rb') as f:
-            buf = cls(f.read(), endian)
+        if offset < 0:
+            raise ValueError('negative offset: {}'.format(offset))
+        if length is not None and length < 0:
+            raise ValueError('negative length: {}'.format(length))
+        buf = cls(endian=endian)
+        with io.FileIO(file, 'r') as f:
+            info = os.fstat(f.fileno())
+            if stat.S_ISREG(info.st_mode) and info.st_size:
+                size = max(info.st_size - offset, 0)
+                if length is not None:
+                    size = min(size, length)
+                f.seek(offset)
+                if size:
+                    buf.seek(size - 1)
+                    buf.write(b'\x00')
+                view = buf.getbuffer()
+                filled = 0
+                # a single read may return less than asked (e.g. above 2GB on
+                # linux), keep going until everything is there
+                while filled < size:
+                    received = f.readinto(view[filled:])
+                    if not received:
+                        break
+                    filled += received
+                view.release()
+                buf.truncate(filled)
+            else:
+                # the size is unknown (pipes, devices, /proc), read until the
+                # end
+                if f.seekable():
+                    f.seek(offset)
+                else:
+                    while offset > 0:
+                        skipped = len(f.read(min(offset, _CHUNK_SIZE)))
+                        if not skipped:
+                            break
+                        offset -= skipped
+                while length is None or length > 0:
+                    chunk = f.read(_CHUNK_SIZE if length is None
+                        else min(length, _CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    buf.write(chunk)
+                    if length is not None:
+                        length -= len(chunk)
+        buf.seek(0)
         return buf
 
     @classmethod
@@ -212,6 +795,28 @@ class Buffer(io.BytesIO,_Binary):
         """
         return cls(binascii.unhexlify(hex.encode()), endian)
 
+    @classmethod
+    def from_hex_stream(cls, iterable, endian=BE):
+        """
+            Decode an iterable of hexadecimal strings or bytes (for example
+            the lines of a file) chunk by chunk, ignoring whitespace, and
+            place its content in a buffer. Return that buffer.
+        """
+        buf = cls(endian=endian)
+        pending = ''
+        for chunk in iterable:
+            if not isinstance(chunk, str):
+                chunk = bytes(chunk).decode('ascii')
+            chunk = pending + ''.join(chunk.split())
+            # a byte may be split across two chunks
+            even = len(chunk) & ~1
+            buf.write(binascii.unhexlify(chunk[:even].encode()))
+            pending = chunk[even:]
+        if pending:
+            raise binascii.Error('Odd-length string')
+        buf.seek(0)
+        return buf
+
 
 class Wrapper(_Binary):
     """
@@ -227,3 +832,347 @@ class Wrapper(_Binary):
     def __getattr__(self, attr):
         return getattr(self._file_like, attr)
 
+
+class SocketStream(_Binary):
+    """
+        Add binary methods to a connected socket.
+
+        Received data goes through a reusable buffer and written data is
+        queued until flush(), then sent in a single sendmsg() call.
+    """
+    def __init__(self, socket, endian=BE, buffer_size=_CHUNK_SIZE):
+        self.socket = socket
+        self.endian = endian
+        self.buffer_size = buffer_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._pending = []
+        self._pending_size = 0
+
+    def __getattr__(self, attr):
+        return getattr(self.socket, attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _receive(self, length):
+        """
+            Receive until <length> bytes are buffered. Return False if the
+            connection was closed first.
+        """
+        if self._end - self._start >= length:
+            return True
+        if length > len(self._buffer):
+            buffer = bytearray(max(length, len(self._buffer) * 2))
+            buffer[:self._end - self._start] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+            self._end -= self._start
+            self._start = 0
+        elif self._start + length > len(self._buffer):
+            # move the unread data to the front to make room
+            self._view[:self._end - self._start] = \
+                self._view[self._start:self._end]
+            self._end -= self._start
+            self._start = 0
+        while self._end - self._start < length:
+            received = self.socket.recv_into(self._view[self._end:])
+            if not received:
+                return False
+            self._end += received
+        return True
+
+    def _consume(self, length):
+        end = min(self._start + length, self._end)
+        data = self._view[self._start:end]
+        self._start = end
+        return data
+
+    def read(self, length=-1):
+        """
+            Read <length> bytes, or until the connection is closed if
+            <length> is negative. Return less if the connection is closed
+            first.
+        """
+        if length < 0:
+            while self._receive(self._end - self._start + 1):
+                pass
+            length = self._end - self._start
+        else:
+            self._receive(length)
+        return bytes(self._consume(length))
+
+    def peek(self, length=-1):
+        """
+            Return <length> bytes without consuming them. If <length> is
+            negative, return what has been received so far.
+        """
+        if length < 0:
+            self._receive(1)
+            length = self._end - self._start
+        else:
+            self._receive(length)
+        end = min(self._start + length, self._end)
+        return bytes(self._view[self._start:end])
+
+    def _peek_varint(self):
+        # only wait for more data while the last byte is missing
+        size = 1
+        while True:
+            if not self._receive(size):
+                raise EOFError('truncated varint')
+            data = self._view[self._start:self._end]
+            for i, byte in enumerate(data):
+                if not byte & 0x80:
+                    return _decode_varints(data[:i + 1])[0], i + 1
+            size = len(data) + 1
+
+    def read_varint(self):
+        value, size = self._peek_varint()
+        self._start += size
+        return value
+
+    def read_frame(self, prefix='uint', max_size=1 << 30):
+        """
+            Read a frame made of its length, of type <prefix>, followed by its
+            content. Return the content as a memoryview of the receive buffer,
+            only valid until the next read, or None if the connection was
+            closed before the frame started. Raise ValueError, without
+            consuming anything, if the length is negative or exceeds
+            <max_size>.
+        """
+        size = self.endian[prefix].size
+        if not self._receive(size):
+            if self._start == self._end:
+                return None
+            raise EOFError('connection closed inside a frame')
+        length = self.endian[prefix].unpack_from(self._buffer, self._start)[0]
+        if length < 0:
+            raise ValueError('negative frame length: {}'.format(length))
+        if max_size is not None and length > max_size:
+            raise ValueError('frame too large: {} bytes'.format(length))
+        if not self._receive(size + length):
+            raise EOFError('connection closed inside a frame')
+        self._start += size
+        return self._consume(length)
+
+    def write(self, data):
+        """
+            Queue <data>, sending everything when more than buffer_size bytes
+            are waiting.
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        if not data:
+            return 0
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+        return len(data)
+
+    def write_frame(self, data, prefix='uint'):
+        """
+            Queue <data> preceded by its length of type <prefix>.
+        """
+        self.write(self.endian[prefix].pack(len(data)))
+        self.write(data)
+
+    def flush(self):
+        """
+            Send all the queued data.
+        """
+        if not hasattr(self.socket, 'sendmsg'):
+            self.socket.sendall(b''.join(self._pending))
+            self._pending = []
+        while self._pending:
+            batch = self._pending[:_IOV_MAX]
+            sent = self.socket.sendmsg(batch)
+            done = 0
+            while done < len(batch) and sent >= len(batch[done]):
+                sent -= len(batch[done])
+                done += 1
+            del self._pending[:done]
+            if sent:
+                self._pending[0] = memoryview(self._pending[0])[sent:]
+        self._pending_size = 0
+
+    def close(self):
+        """
+            Send the queued data and close the socket.
+        """
+        try:
+            if self.socket.fileno() != -1:
+                self.flush()
+        finally:
+            self.socket.close()
+
+
+class RecordIndex:
+    """
+        Index the length-prefixed records of a binary object for random
+        access.
+
+        The offsets are stored in a sidecar file as a 16 bytes header (magic,
+        endianness and prefix type) followed by an array of native unsigned
+        64 bits integers, the first being the start of the first record and
+        the last the end of the last record. When the sidecar exists and
+        the file was only appended to, it is reused and only the new records
+        are scanned. Otherwise the index is rebuilt.
+    """
+    def __init__(self, binary, path, prefix='uint', start=0):
+        self.binary = binary
+        self.path = path
+        self.prefix = prefix
+        self.start = start
+        import array
+        self.offsets = array.array('Q')
+        self._saved = 0
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(16)
+                size = os.fstat(f.fileno()).st_size - len(header)
+                if header == self._header() and \
+                        size % self.offsets.itemsize == 0:
+                    self.offsets.fromfile(f, size // self.offsets.itemsize)
+                    self._saved = len(self.offsets)
+        except FileNotFoundError:
+            pass
+        self.update()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, n):
+        return self.get(n)
+
+    def __iter__(self):
+        return self.iter()
+
+    def _header(self):
+        return b'BINIDX' + self.binary.endian['symbol'].encode() + \
+            self.prefix.encode().ljust(9, b'\x00')
+
+    def _valid(self, size):
+        """
+            Check the indexed records are still there by comparing the
+            length prefix of the first and last ones with the offsets.
+        """
+        if not self.offsets or self.offsets[0] != self.start:
+            return False
+        if self.offsets[-1] > size:
+            return False
+        if len(self.offsets) == 1:
+            # no record indexed yet
+            return True
+        prefix = self.binary.endian[self.prefix]
+        for n in {0, len(self.offsets) - 2}:
+            self.binary.seek(self.offsets[n])
+            data = self.binary.read(prefix.size)
+            length = self.offsets[n + 1] - self.offsets[n] - prefix.size
+            if len(data) != prefix.size or prefix.unpack(data)[0] != length:
+                return False
+        return True
+
+    def update(self):
+        """
+            Scan the records added since the last update and save their
+            offsets. Return the amount of new records.
+        """
+        prefix = self.binary.endian[self.prefix]
+        size = self.binary.seek(0, os.SEEK_END)
+        if not self._valid(size):
+            # the file was truncated or replaced, start over
+            del self.offsets[:]
+            self.offsets.append(self.start)
+            self._saved = 0
+        position = self.offsets[-1]
+        before = len(self.offsets)
+        chunk = b''
+        chunk_start = position
+        while position + prefix.size <= size:
+            if position + prefix.size > chunk_start + len(chunk):
+                self.binary.seek(position)
+                chunk = self.binary.read(_CHUNK_SIZE)
+                chunk_start = position
+            length = prefix.unpack_from(chunk, position - chunk_start)[0]
+            if length < 0:
+                raise ValueError('negative record length {} at {}'.format(
+                    length, position))
+            end = position + prefix.size + length
+            if end > size:
+                # incomplete record, wait for the rest to be written
+                break
+            position = end
+            self.offsets.append(position)
+        self._save()
+        return len(self.offsets) - before
+
+    def _save(self):
+        if self._saved == len(self.offsets):
+            return
+        with open(self.path, 'ab' if self._saved else 'wb') as f:
+            if not self._saved:
+                f.write(self._header())
+            self.offsets[self._saved:].tofile(f)
+        self._saved = len(self.offsets)
+
+    def get(self, n):
+        """
+            Return the content of record <n>.
+        """
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError('record index out of range')
+        start = self.offsets[n] + self.binary.endian[self.prefix].size
+        self.binary.seek(start)
+        return self.binary.read(self.offsets[n + 1] - start)
+
+    def iter(self, start=0, stop=None):
+        """
+            Yield the content of records <start> to <stop> (excluded),
+            reading them in one pass.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return
+        size = self.binary.endian[self.prefix].size
+        self.binary.seek(self.offsets[start])
+        for n in range(start, stop):
+            self.binary.skip(size)
+            yield self.binary.read(self.offsets[n + 1] - self.offsets[n] - size)
+
+
+def hexdump(stream, width=16, offset=0):
+    """
+        Read <stream> until the end and yield its content as lines in the
+        xxd layout, <width> bytes per line. Addresses start at <offset>.
+    """
+    if width < 1:
+        raise ValueError('width must be at least 1')
+    printable = bytes(c if 0x20 <= c < 0x7f else 0x2e for c in range(256))
+    columns = width * 2 + (width - 1) // 2
+    block = b''
+    while True:
+        # read many lines at once, only one block is held in memory
+        data = stream.read(width * 256)
+        # short reads are possible (pipes, sockets), keep the incomplete
+        # line for the next block
+        block += data
+        end = len(block) if not data else len(block) - len(block) % width
+        for start in range(0, end, width):
+            line = block[start:start + width]
+            hex = line.hex()
+            hex = ' '.join(hex[i:i + 4] for i in range(0, len(hex), 4))
+            yield '{:08x}: {:<{}}  {}'.format(offset, hex, columns,
+                line.translate(printable).decode('ascii'))
+            offset += len(line)
+        if not data:
+            break
+        block = block[end:]
@@ -2,11 +2,18 @@
 
 import pytest
 
+import array
 import binascii
+import io
 import math
 import os
+import socket
 import struct
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 
 import binary
 
@@ -58,11 +65,52 @@ class TestBasics:
         with binary.Buffer.from_file(temp_file) as b:
             assert b.read() == test_data
 
+    def test_create_buffer_from_file_slice(self, temp_file):
+        with binary.Buffer.from_file(temp_file, offset=8) as b:
+            assert b.read() == test_data[8:]
+
+        with binary.Buffer.from_file(temp_file, offset=8, length=4) as b:
+            assert b.read() == test_data[8:12]
+
+        with binary.Buffer.from_file(temp_file, offset=8, length=100) as b:
+            assert b.read() == test_data[8:]
+
+        with binary.Buffer.from_file(temp_file, offset=100) as b:
+            assert b.read() == b''
+
+        with pytest.raises(ValueError):
+            binary.Buffer.from_file(temp_file, offset=-1)
+
+    def test_create_buffer_from_pipe(self):
+        read, write = os.pipe()
+        os.write(write, test_data)
+        os.close(write)
+        with binary.Buffer.from_file(read, offset=2, length=10) as b:
+            assert b.read() == test_data[2:12]
+
+    @pytest.mark.skipif(not os.path.exists('/proc/self/status'),
+        reason='requires /proc')
+    def test_create_buffer_from_proc(self):
+        with binary.Buffer.from_file('/proc/self/status') as b:
+            assert b.read(5) == b'Name:'
+
     def test_create_buffer_from_hex(self):
         hex = binascii.hexlify(test_data).decode()
         with binary.Buffer.from_hex(hex) as b:
             assert b.read() == test_data
 
+    def test_create_buffer_from_hex_stream(self):
+        hex = binascii.hexlify(test_data).decode()
+        lines = [hex[:3], ' ' + hex[3:10] + '\n', '\t' + hex[10:], '']
+        with binary.Buffer.from_hex_stream(lines) as b:
+            assert b.read() == test_data
+
+        with binary.Buffer.from_hex_stream(l.encode() for l in lines) as b:
+            assert b.read() == test_data
+
+        with pytest.raises(binascii.Error):
+            binary.Buffer.from_hex_stream(['000'])
+
     def test_create_wrapper(self, temp_file):
         with open(temp_file, 'rb') as f:
             w = binary.Wrapper(f)
@@ -81,6 +129,46 @@ class TestBasics:
         with binary.File(temp_file, endian=binary.LE) as f:
             assert f.endian == binary.LE
 
+        assert 'int' in binary.LE
+        assert 'uint24' in binary.BE
+        assert 'nope' not in binary.BE
+        assert list(binary.BE)[:3] == ['symbol', 'bool', 'byte']
+        assert dict(binary.LE)['short'].format == '<h'
+
+        with binary.Buffer(b'\x01\x00', endian=binary.NE) as b:
+            if sys.byteorder == 'little':
+                assert b.read_short() == 1
+            else:
+                assert b.read_short() == 256
+
+    def test_import(self):
+        """
+            Guard startup cost: importing must not pull extra modules.
+        """
+        code = 'import sys; before = set(sys.modules); import binary; ' \
+            'print(" ".join(sorted(set(sys.modules) - before)))'
+        output = subprocess.check_output([sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.abspath(binary.__file__)))
+        assert set(output.decode().split()) <= {'binary', 'binascii', 'io',
+            'itertools', 'os', 'stat', 'struct', '_struct', 'sys', 'time'}
+
+    def test_import_time(self):
+        """
+            Guard startup cost: importing must stay within a few milliseconds
+            (including compilation when no bytecode is cached). The fastest
+            of several runs is used to smooth out noise.
+        """
+        timings = []
+        for _ in range(5):
+            output = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', 'import binary'],
+                cwd=os.path.dirname(os.path.abspath(binary.__file__)),
+                stderr=subprocess.PIPE, check=True).stderr.decode()
+            for line in output.splitlines():
+                if line.endswith('| binary'):
+                    timings.append(int(line.split('|')[1]))
+        assert min(timings) < 50000 # microseconds
+
     def test_peek(self):
         with binary.Buffer(test_data) as b:
             assert b.peek(len(test_data)) == test_data
@@ -93,6 +181,89 @@ class TestBasics:
             b.seek(0)
             assert b.read() == test_data
 
+    def test_fill_large(self):
+        with binary.Buffer() as b:
+            b.fill(200000)
+            b.fill(70000, b'\xFF')
+            b.fill(3, b'ab')
+            assert bytes(b) == b'\x00' * 200000 + b'\xFF' * 70000 + b'ababab'
+
+        with binary.Buffer() as b:
+            b.fill(-1)
+            b.fill(-1, b'\xFF')
+            b.fill(10, b'')
+            b.fill(0)
+            assert bytes(b) == b''
+
+    def test_skip(self):
+        with binary.Buffer(test_data) as b:
+            b.skip(10)
+            assert b.tell() == 10
+            assert b.read(1) == b'\xFF'
+
+    def test_skip_not_seekable(self, temp_file):
+        with open(temp_file, 'rb', buffering=0) as f:
+            f.seekable = lambda: False
+            w = binary.Wrapper(f)
+            w.skip(10)
+            assert w.read(1) == b'\xFF'
+            w.skip(100)
+            assert w.read() == b''
+
+    def test_align(self):
+        with binary.Buffer(test_data) as b:
+            b.align(4)
+            assert b.tell() == 0
+            b.skip(1)
+            b.align(4)
+            assert b.tell() == 4
+            b.skip(7)
+            b.align(8)
+            assert b.tell() == 16
+
+        with binary.Buffer() as b:
+            b.write(b'\x01')
+            b.align(4, b'\xFF')
+            b.align(4, b'\xFF')
+            assert bytes(b) == b'\x01\xFF\xFF\xFF'
+
+        with binary.Buffer() as b:
+            b.write(b'\x01')
+            b.align(4, b'ab')
+            assert b.tell() == 4
+            assert bytes(b) == b'\x01aba'
+
+    def test_hexdump_short_reads(self):
+        class Stream:
+            blocks = [b'\x00' * 5, b'\xFF' * 20, b'a']
+            def read(self, length):
+                return self.blocks.pop(0) if self.blocks else b''
+
+        assert list(binary.hexdump(Stream(), width=16)) == [
+            '00000000: 0000 0000 00ff ffff ffff ffff ffff ffff'
+            '  ................',
+            '00000010: ffff ffff ffff ffff ff61' + ' ' * 15 + '  .........a',
+            ]
+
+        with pytest.raises(ValueError):
+            list(binary.hexdump(Stream(), width=0))
+
+    def test_hexdump(self):
+        with binary.Buffer(test_data + b'a.') as b:
+            assert list(binary.hexdump(b)) == [
+                '00000000: 0000 0000 0000 0000 0000 ffff ffff ff61'
+                '  ...............a',
+                '00000010: 2e' + ' ' * 37 + '  .',
+                ]
+
+        with binary.Buffer(test_data) as b:
+            assert list(binary.hexdump(b, width=4, offset=16)) == [
+                '00000010: 0000 0000  ....',
+                '00000014: 0000 0000  ....',
+                '00000018: 0000 ffff  ....',
+                '0000001c: ffff ff    ...',
+                ]
+
 
 class TestPeekRead:
     """
@@ -349,6 +520,79 @@ class TestPeekRead:
             assert math.isnan(b.peek_double()) == True
             assert math.isnan(b.read_double()) == True
 
+    def test_half(self):
+        data = b'\x00\x00\x3C\x00\x7E\x00'
+
+        with binary.Buffer(data, endian=binary.BE) as b:
+            assert b.peek_half() == 0.
+            assert b.read_half() == 0.
+            assert b.peek_half() == 1.
+            assert b.read_half() == 1.
+            assert math.isnan(b.peek_half()) == True
+            assert math.isnan(b.read_half()) == True
+
+        data = b'\x00\x00\x00\x3C\x00\x7E'
+
+        with binary.Buffer(data, endian=binary.LE) as b:
+            assert b.read_half() == 0.
+            assert b.read_half() == 1.
+            assert math.isnan(b.read_half()) == True
+
+    def test_int24(self):
+        data = b'\x00\x00\x00\x00\x00\x01\xFF\xFF\xFF\x80\x00\x00'
+
+        with binary.Buffer(data, endian=binary.BE) as b:
+            assert b.peek_int24() == 0
+            assert b.read_int24() == 0
+            assert b.peek_int24() == 1
+            assert b.read_int24() == 1
+            assert b.peek_int24() == -1
+            assert b.read_int24() == -1
+            assert b.peek_int24() == -8388608
+            assert b.read_int24() == -8388608
+
+        with binary.Buffer(data, endian=binary.LE) as b:
+            assert b.read_int24() == 0
+            assert b.read_int24() == 65536
+            assert b.read_int24() == -1
+            assert b.read_int24() == 128
+            with pytest.raises(struct.error):
+                b.read_int24()
+
+    def test_uint24(self):
+        data = b'\x00\x00\x01\xFF\xFF\xFF'
+
+        with binary.Buffer(data, endian=binary.BE) as b:
+            assert b.peek_uint24() == 1
+            assert b.read_uint24() == 1
+            assert b.peek_uint24() == 16777215
+            assert b.read_uint24() == 16777215
+
+        with binary.Buffer(data, endian=binary.LE) as b:
+            assert b.read_uint24() == 65536
+            assert b.read_uint24() == 16777215
+
+    def test_varint(self):
+        data = b'\x00\x01\xAC\x02\x03\xD7\x04\x80'
+
+        with binary.Buffer(data) as b:
+            assert b.peek_varint() == 0
+            assert b.read_varint() == 0
+            assert b.peek_varint() == 1
+            assert b.read_varint() == 1
+            assert b.peek_varint() == 300
+            assert b.read_varint() == 300
+            assert b.peek_svarint() == -2
+            assert b.read_svarint() == -2
+            assert b.peek_svarint() == -300
+            assert b.read_svarint() == -300
+            with pytest.raises(EOFError):
+                b.read_varint()
+
+        with binary.Buffer(b'\xFF' * 10 + b'\x01\x02') as b:
+            assert b.read_varint() == 2 ** 71 - 1
+            assert b.read_varint() == 2
+
     def test_hex(self):
         data = b'\x00\x01\xFF'
         hex = '0001ff'
@@ -357,6 +601,10 @@ class TestPeekRead:
             assert b.peek_hex(3) == hex
             assert b.read_hex(3) == hex
 
+        with binary.Buffer(data) as b:
+            assert b.peek_hex(3, sep=' ') == '00 01 ff'
+            assert b.read_hex(3, sep=':') == '00:01:ff'
+
     def test_text(self):
         data = b'\xC3\xA8\x2E\xC3\xA9' + b'\xC3\xA8\x2E\xC3\xA9' + \
             b'\xC3\xA8\x2E\xC3\xA9\x00\xC3\xA8\x2E\xC3\xA9' + \
@@ -607,6 +855,57 @@ class TestWrite:
             b.write_double(float('NaN'))
             assert bytes(b) == data
 
+    def test_half(self):
+        with binary.Buffer(endian=binary.BE) as b:
+            b.write_half(0.)
+            b.write_half(1.)
+            assert bytes(b) == b'\x00\x00\x3C\x00'
+
+        with binary.Buffer(endian=binary.LE) as b:
+            b.write_half(1.)
+            with pytest.raises(struct.error):
+                b.write_half('a')
+            assert bytes(b) == b'\x00\x3C'
+
+    def test_int24(self):
+        with binary.Buffer(endian=binary.BE) as b:
+            b.write_int24(1)
+            b.write_int24(-1)
+            b.write_int24(-8388608)
+            with pytest.raises(struct.error):
+                b.write_int24(8388608)
+            with pytest.raises(struct.error):
+                b.write_int24(1.)
+            assert bytes(b) == b'\x00\x00\x01\xFF\xFF\xFF\x80\x00\x00'
+
+        with binary.Buffer(endian=binary.LE) as b:
+            b.write_int24(1)
+            assert bytes(b) == b'\x01\x00\x00'
+
+    def test_uint24(self):
+        with binary.Buffer(endian=binary.BE) as b:
+            b.write_uint24(1)
+            b.write_uint24(16777215)
+            with pytest.raises(struct.error):
+                b.write_uint24(-1)
+            assert bytes(b) == b'\x00\x00\x01\xFF\xFF\xFF'
+
+        with binary.Buffer(endian=binary.LE) as b:
+            b.write_uint24(1)
+            assert bytes(b) == b'\x01\x00\x00'
+
+    def test_varint(self):
+        with binary.Buffer() as b:
+            b.write_varint(0)
+            b.write_varint(1)
+            b.write_varint(300)
+            b.write_svarint(-2)
+            b.write_svarint(-300)
+            b.write_svarint(1)
+            with pytest.raises(ValueError, match='non-negative'):
+                b.write_varint(-1)
+            assert bytes(b) == b'\x00\x01\xAC\x02\x03\xD7\x04\x02'
+
     def test_hex(self):
         data = b'\x00\x01\xFF\x00'
         hex = '0001ff'
@@ -627,3 +926,419 @@ class TestWrite:
             b.write_text(text, encoding='iso-8859-1')
             b.write_text(text, length=2)
             assert bytes(b) == data
+
+class TestRecordIndex:
+    """
+        Check records are indexed, retrieved and the index reused.
+    """
+    records = [b'first', b'', b'\x00' * 70000, b'last']
+
+    def write_records(self, name, records, mode='wb'):
+        with binary.File(name, mode) as f:
+            for record in records:
+                f.write_uint(len(record))
+                f.write(record)
+
+    def test_index(self, temp_file):
+        self.write_records(temp_file, self.records)
+        try:
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx')
+                assert len(index) == 4
+                assert index.get(0) == b'first'
+                assert index[1] == b''
+                assert index[2] == self.records[2]
+                assert index[-1] == b'last'
+                with pytest.raises(IndexError):
+                    index.get(4)
+                assert list(index) == self.records
+                assert list(index.iter(1, 3)) == self.records[1:3]
+        finally:
+            os.remove(temp_file + '.idx')
+
+    def test_index_update(self, temp_file):
+        self.write_records(temp_file, self.records[:2])
+        try:
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx')
+                assert len(index) == 2
+
+            # partial record is not indexed
+            self.write_records(temp_file, self.records[2:], 'ab')
+            with binary.File(temp_file, 'ab') as f:
+                f.write_uint(10)
+                f.write(b'abc')
+
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx')
+                assert len(index) == 4
+                assert list(index) == self.records
+                assert index.update() == 0
+
+            with open(temp_file + '.idx', 'rb') as f:
+                assert len(f.read()) == 16 + 5 * 8
+
+            # truncated file triggers a rebuild
+            self.write_records(temp_file, self.records[:1])
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx')
+                assert list(index) == self.records[:1]
+        finally:
+            os.remove(temp_file + '.idx')
+
+    def test_index_rewritten(self, temp_file):
+        self.write_records(temp_file, [b'a\x00\x00\x00\x00\x02', b'bb'])
+        try:
+            with binary.File(temp_file) as f:
+                assert len(binary.RecordIndex(f, temp_file + '.idx')) == 2
+
+            # same size, different content
+            records = [b'a', b'bbbbb', b'cc']
+            self.write_records(temp_file, records)
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx')
+                assert list(index) == records
+
+            # different prefix
+            with binary.File(temp_file) as f:
+                index = binary.RecordIndex(f, temp_file + '.idx', 'ubyte')
+                assert list(index) == [b'', b'', b'', b'a', b'', b'', b'',
+                    b'bbbbb', b'', b'', b'', b'cc']
+        finally:
+            os.remove(temp_file + '.idx')
+
+    def test_index_empty(self, temp_file):
+        open(temp_file, 'wb').close()
+        try:
+            for _ in range(2):
+                with binary.File(temp_file) as f:
+                    index = binary.RecordIndex(f, temp_file + '.idx')
+                    assert len(index) == 0
+                    assert list(index) == []
+        finally:
+            os.remove(temp_file + '.idx')
+
+    def test_index_negative_length(self):
+        with binary.Buffer(b'\xFF\xFF\xFF\xFC') as b:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'idx')
+                with pytest.raises(ValueError):
+                    binary.RecordIndex(b, path, prefix='int')
+
+    def test_index_prefix(self):
+        with binary.Buffer(endian=binary.LE) as b:
+            b.write(b'\x00' * 4)
+            records = [b'first', b'', b'last']
+            for record in records:
+                b.write_ushort(len(record))
+                b.write(record)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'idx')
+                index = binary.RecordIndex(b, path, prefix='ushort', start=4)
+                assert list(index) == records
+
+class TestSocketStream:
+    """
+        Check data goes through a pair of connected sockets.
+    """
+    def test_read_write(self):
+        a, b = socket.socketpair()
+        with binary.SocketStream(a) as writer, \
+                binary.SocketStream(b, buffer_size=4) as reader:
+            writer.write_int(-1)
+            writer.write_ushort(1)
+            writer.fill(10)
+            writer.write(test_data)
+            writer.flush()
+            assert reader.peek_int() == -1
+            assert reader.read_int() == -1
+            assert reader.read_ushort() == 1
+            reader.skip(10)
+            assert reader.read(5) == test_data[:5]
+            writer.close()
+            assert reader.read() == test_data[5:]
+            assert reader.read(1) == b''
+
+    def test_frames(self):
+        a, b = socket.socketpair()
+        frames = [b'first', b'', b'\x00' * 70000, b'last']
+
+        def write(writer):
+            for frame in frames:
+                writer.write_frame(frame)
+            writer.write_ushort(4)
+            writer.write(b'abcd')
+            writer.write_uint(10)
+            writer.write(b'abc')
+            writer.close()
+
+        # write from a thread, the frames may not fit in the socket buffers
+        writer = binary.SocketStream(a)
+        thread = threading.Thread(target=write, args=(writer,))
+        thread.start()
+        try:
+            with binary.SocketStream(b, endian=binary.LE) as reader:
+                reader.endian = binary.BE
+                for frame in frames:
+                    assert reader.read_frame() == frame
+                assert bytes(reader.read_frame('ushort')) == b'abcd'
+                with pytest.raises(EOFError):
+                    reader.read_frame()
+        finally:
+            thread.join()
+
+    def test_varint(self):
+        a, b = socket.socketpair()
+        with binary.SocketStream(a) as writer, \
+                binary.SocketStream(b) as reader:
+            writer.write_varint(300)
+            writer.write_svarint(-300)
+            writer.flush()
+            assert reader.peek_varint() == 300
+            assert reader.read_varint() == 300
+            assert reader.peek_svarint() == -300
+            assert reader.read_svarint() == -300
+
+    def test_frame_too_large(self):
+        a, b = socket.socketpair()
+        with binary.SocketStream(a) as writer, \
+                binary.SocketStream(b) as reader:
+            writer.write_ulong(2 ** 63)
+            writer.write_frame(b'abc')
+            writer.flush()
+            with pytest.raises(ValueError):
+                reader.read_frame('ulong')
+            reader.skip(8)
+            with pytest.raises(ValueError):
+                reader.read_frame(max_size=2)
+            assert reader.read_frame(max_size=3) == b'abc'
+
+    def test_frame_negative(self):
+        a, b = socket.socketpair()
+        with binary.SocketStream(a) as writer, \
+                binary.SocketStream(b) as reader:
+            writer.write_int(-3)
+            writer.write(b'abc')
+            writer.flush()
+            with pytest.raises(ValueError):
+                reader.read_frame('int')
+            assert reader.read(4) == b'\xFF\xFF\xFF\xFD'
+
+    def test_closed(self):
+        a, b = socket.socketpair()
+        with binary.SocketStream(b) as reader:
+            a.close()
+            assert reader.read_frame() is None
+
+class TestJournal:
+    """
+        Check records are appended in groups and synced per the policy.
+    """
+    def test_group(self, temp_file):
+        with binary.Journal(temp_file, group_size=8, sync='never') as j:
+            j.write_int(1)
+            j.commit()
+            assert os.path.getsize(temp_file) == len(test_data)
+            j.write_int(2)
+            j.write_text('abc')
+            assert os.path.getsize(temp_file) == len(test_data)
+            j.commit()
+            assert os.path.getsize(temp_file) == len(test_data) + 11
+            j.write_short(3)
+            j.commit()
+            j.flush()
+            assert os.path.getsize(temp_file) == len(test_data) + 13
+            j.write_short(4)
+
+        with binary.File(temp_file) as f:
+            assert f.read(len(test_data)) == test_data
+            assert f.read() == b'\x00\x00\x00\x01\x00\x00\x00\x02abc' + \
+                b'\x00\x03\x00\x04'
+
+    def test_position(self, temp_file):
+        with binary.Journal(temp_file, sync='never') as j:
+            assert j.tell() == len(test_data)
+            j.write(b'ab')
+            j.align(4, b'\x00')
+            assert j.tell() == 20
+            j.commit()
+            j.write_int(1)
+            assert j.tell() == 24
+            assert not j.seekable()
+            with pytest.raises(io.UnsupportedOperation):
+                j.seek(0)
+            with pytest.raises(io.UnsupportedOperation):
+                j.peek(1)
+            with pytest.raises(io.UnsupportedOperation):
+                j.skip(1)
+            with pytest.raises(io.UnsupportedOperation):
+                j.align(16)
+
+        with binary.File(temp_file) as f:
+            assert f.read()[len(test_data):] == \
+                b'ab\x00\x00\x00' + b'\x00\x00\x00\x01'
+
+    def test_flush_interval(self, temp_file):
+        with binary.Journal(temp_file, flush_interval=0.01) as j:
+            j.write_int(1)
+            j.commit()
+            for _ in range(100):
+                if os.path.getsize(temp_file) > len(test_data):
+                    break
+                time.sleep(0.01)
+            assert os.path.getsize(temp_file) == len(test_data) + 4
+
+    def test_sync(self, temp_file, monkeypatch):
+        synced = []
+        monkeypatch.setattr(os, 'fsync', synced.append)
+
+        with binary.Journal(temp_file, sync='never') as j:
+            j.write_int(1)
+            j.commit()
+            j.flush()
+        assert len(synced) == 0
+
+        with binary.Journal(temp_file, sync='group') as j:
+            j.write_int(1)
+            j.commit()
+            j.flush()
+            j.flush()
+            assert len(synced) == 1
+        assert len(synced) == 1
+
+        with binary.Journal(temp_file, sync='interval', sync_interval=60) as j:
+            j.write_int(1)
+            j.commit()
+            j.flush()
+            assert len(synced) == 1
+        assert len(synced) == 2
+
+        with pytest.raises(ValueError):
+            binary.Journal(temp_file, sync='always')
+
+    def test_interval_thread(self, temp_file, monkeypatch):
+        synced = []
+        monkeypatch.setattr(os, 'fsync', synced.append)
+
+        with binary.Journal(temp_file, sync='interval', sync_interval=0.01) as j:
+            j.write_int(1)
+            j.commit()
+            for _ in range(100):
+                if synced:
+                    break
+                time.sleep(0.01)
+            assert len(synced) == 1
+            assert os.path.getsize(temp_file) == len(test_data) + 4
+
+    def test_background_error(self, temp_file, monkeypatch):
+        def fsync(fd):
+            raise OSError('disk full')
+        monkeypatch.setattr(os, 'fsync', fsync)
+
+        j = binary.Journal(temp_file, flush_interval=0.01)
+        j.write_int(1)
+        j.commit()
+        for _ in range(100):
+            if j._error is not None:
+                break
+            time.sleep(0.01)
+        with pytest.raises(OSError):
+            j.commit()
+        with pytest.raises(OSError):
+            j.flush()
+        with pytest.raises(OSError):
+            j.close()
+        assert j.closed
+        with open(temp_file, 'rb') as f:
+            assert f.read() == test_data + b'\x00\x00\x00\x01'
+
+
+class TestColumns:
+    """
+        Check records are transposed to/from one array per field.
+    """
+    layout = ['long', 'ubyte', 2, 'short', 'double']
+    data = b'\x00\x00\x00\x00\x00\x00\x00\x01' + b'\x01' + b'\x00\x00' + \
+        b'\xFF\xFF' + b'\x3F\xF0\x00\x00\x00\x00\x00\x00' + \
+        b'\xFF\xFF\xFF\xFF\xFF\xFF\xFF\xFF' + b'\xFF' + b'\x00\x00' + \
+        b'\x00\x02' + b'\x00\x00\x00\x00\x00\x00\x00\x00'
+    columns = [[1, -1], [1, 255], [-1, 2], [1., 0.]]
+
+    def test_read(self):
+        with binary.Buffer(self.data + b'\x00', endian=binary.BE) as b:
+            columns = b.read_columns(self.layout, 3)
+            assert all(isinstance(c, array.array) for c in columns)
+            assert [c.tolist() for c in columns] == self.columns
+
+        with binary.Buffer(self.data, endian=binary.LE) as b:
+            assert b.read_columns(['short'], 3)[0].tolist() == [0, 0, 0]
+            assert b.read_columns(['ushort'], 1)[0].tolist() == [256]
+
+        with pytest.raises(ValueError):
+            binary.Buffer(self.data).read_columns(['int24'], 1)
+        with pytest.raises(ValueError):
+            binary.Buffer(self.data).read_columns([], 1)
+        with pytest.raises(ValueError):
+            binary.Buffer(self.data).read_columns([4], 1)
+        with pytest.raises(ValueError):
+            binary.Buffer(self.data).read_columns(['int'], -1)
+
+        with binary.Buffer(b'\x00' * 9) as b:
+            assert b.read_columns(['int'], 3)[0].tolist() == [0, 0]
+            assert b.tell() == 8
+
+    def test_write(self):
+        with binary.Buffer(endian=binary.BE) as b:
+            b.write_columns(self.layout, self.columns)
+            assert bytes(b) == self.data
+
+        with binary.Buffer(endian=binary.LE) as b:
+            b.write_columns(['ushort', 'bool'], [array.array('H', [256]), [True]])
+            assert bytes(b) == b'\x00\x01\x01'
+
+        with binary.Buffer() as b:
+            with pytest.raises(ValueError):
+                b.write_columns(['int', 'int'], [[1]])
+            with pytest.raises(ValueError):
+                b.write_columns(['int', 'int'], [[1], [1, 2]])
+
+
+class TestCodecs:
+    """
+        Check integer sequences survive delta and run-length encoding.
+    """
+    timestamps = [1700000000 + 10 * i + i % 3 for i in range(1000)]
+
+    def test_deltas(self):
+        with binary.Buffer() as b:
+            b.write_deltas(self.timestamps)
+            size = b.tell()
+            b.write_deltas(self.timestamps, order=2)
+            b.write_deltas([])
+            b.write_deltas([-5, 5, -5], order=3)
+            assert size < len(self.timestamps) * 2
+            b.seek(0)
+            assert b.read_deltas() == self.timestamps
+            assert b.read_deltas(order=2) == self.timestamps
+            assert b.read_deltas() == []
+            assert b.read_deltas(order=3) == [-5, 5, -5]
+
+    def test_runs(self):
+        values = [0] * 1000 + [1, 1, -1] + [2 ** 70] * 3
+
+        with binary.Buffer() as b:
+            b.write_runs(values)
+            b.write_runs([])
+            assert b.tell() < 30
+            b.seek(0)
+            assert b.read_runs() == values
+            assert b.read_runs() == []
+
+    def test_truncated(self):
+        with binary.Buffer() as b:
+            b.write_deltas(self.timestamps)
+            data = bytes(b)
+
+        with binary.Buffer(data[:-1]) as b:
+            with pytest.raises(ValueError):
+                b.read_deltas()